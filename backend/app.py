@@ -1,6 +1,6 @@
 import json
 import os
-from flask import Flask, render_template, request, session
+from flask import Flask, render_template, request
 from flask_cors import CORS
 from helpers.MySQLDatabaseHandler import MySQLDatabaseHandler
 import pandas as pd
@@ -27,36 +27,49 @@ cossim_json_file_path = os.path.join(current_directory, 'webnovel_to_fanfic_coss
 
 """========================== Gathering data: ============================="""
 def getKeyInfo(data,key):
-    lst = []
-    for i in range(len(data)):
-        lst.append(data[i][key])
-    return lst
+    return [d[key] for d in data]
+
+def trigrams(text):
+    return {text[i:i+3] for i in range(len(text) - 2)}
+
+def build_trigram_index(titles_lower):
+    """ Maps every character trigram to the sorted list of novel indexes 
+    with at least one title containing that trigram.
+    """
+    index = {}
+    for i, titles in enumerate(titles_lower):
+        novel_trigrams = set()
+        for title in titles:
+            novel_trigrams |= trigrams(title)
+        for gram in novel_trigrams:
+            index.setdefault(gram, []).append(i)
+    return index
 
 def getTitleInfo(data):
-    lst = []
-    for i in range(len(data)):
-        lst.append(data[i]['titles'][0])
-    return lst
+    return [d['titles'][0] for d in data]
 
-with open(novel_json_file_path, 'r') as file:
-    novel_data = np.array(json.load(file))
+with open(novel_json_file_path, 'r', encoding='utf-8') as file:
+    novel_data = json.load(file)
     novel_titles = getKeyInfo(novel_data,'titles')
     novel_descriptions = getKeyInfo(novel_data,'description')
     novel_title_to_index = {}
     for i in range (len(novel_titles)):
         novel_title_to_index[novel_titles[i][0]] = i
+    # lowercased copies of every title, built once so json_search does not redo it per keystroke
+    novel_titles_lower = [[title.lower().replace(u"\u2019", "'") for title in titles] for titles in novel_titles]
+    novel_trigram_index = build_trigram_index(novel_titles_lower)
         
 fanfics = {}
 fanfic_files = ['fanfic_G_2019_processed-pg1.json', 'fanfic_G_2019_processed-pg2.json', 'fanfic_G_2019_processed-pg3.json']
 for file in fanfic_files:
     file = os.path.join(current_directory, file)
-    with open(file, 'r') as f: 
+    with open(file, 'r', encoding='utf-8') as f: 
         temp_fanfic_list = json.load(f)
 
         for fanfic_info in temp_fanfic_list:
             fanfics[fanfic_info['id']] = fanfic_info
 
-with open(cossim_json_file_path, 'r') as file: 
+with open(cossim_json_file_path, 'r', encoding='utf-8') as file: 
     file_contents = json.load(file)
     cossims_and_influential_words = file_contents['cossims_and_influential_words']
     fic_popularities = file_contents['fanfic_id_to_popularity']
@@ -84,15 +97,27 @@ def json_search(query):
     matches: [Dict{str: str}] - a list of matching webnovel dictionaries to the query. 
         Each dictionary includes the webovel title and description currently.  
     """
-    print("a1. In json_search(query) in app.py          No app.route()")
+    app.logger.debug("a1. In json_search(query) in app.py          No app.route()")
+    if not query:
+        return []
+    q = query.lower()
+    if len(q) < 3:
+        candidates = range(len(novel_titles_lower))
+    else:
+        # only novels sharing every trigram of the query can contain it
+        postings = sorted((novel_trigram_index.get(gram, []) for gram in trigrams(q)), key=len)
+        survivors = set(postings[0])
+        for posting in postings[1:]:
+            if not survivors:
+                break
+            survivors.intersection_update(posting)
+        candidates = sorted(survivors)
     matches = []
     titles = set()
-    for i in range (len(novel_titles)):
-        for j in range(len(novel_titles[i])):
-            novel_title_copy = novel_titles[i][j].lower().replace(u"\u2019", "'")
-            if query.lower() in novel_title_copy and query != "" and novel_titles[i][0] not in titles:
-                matches.append({'title': novel_titles[i][0],'descr':novel_descriptions[i]})
-                titles.add(novel_titles[i][0])
+    for i in candidates:
+        if novel_titles[i][0] not in titles and any(q in t for t in novel_titles_lower[i]):
+            matches.append({'title': novel_titles[i][0],'descr':novel_descriptions[i]})
+            titles.add(novel_titles[i][0])
     return matches
 
 def user_description_search(user_description):
@@ -129,7 +154,7 @@ def recommendations():
     Called when the user clicks "Show Reccommendations"
     Links to showResults(title) in base.html
     """
-    print("a2. In recomendations() app.py           app.route(/fanfic-recs/)")
+    app.logger.debug("a2. In recomendations() app.py           app.route(/fanfic-recs/)")
     title = request.args.get('title')
     weight = request.args.get("popularity_slider")
     results = webnovel_to_top_fics(title, 49, int(weight)/100)
@@ -152,7 +177,7 @@ def webnovel_to_top_fics(webnovel_title, num_fics, popularity_weight):
         - descriptions
         - etc.
     """
-    print("a3. In webnovel_to_top_fanfictions() app.py         No app.route()")
+    app.logger.debug("a3. In webnovel_to_top_fanfictions() app.py         No app.route()")
     webnovel_index = webnovel_title_to_index[webnovel_title]
     sorted_fanfics_tuplst = cossims_and_influential_words[str(webnovel_index)]
     # top_n = np.copy(sorted_fanfics_tuplst[:num_fics])
@@ -195,13 +220,13 @@ def getExtraFanficInfo(fanfic_id):
 
 @app.route("/")
 def home():
-    print("a4. In home() in app.py          app.route(/)")
+    app.logger.debug("a4. In home() in app.py          app.route(/)")
     return render_template('home.html', title="")
 
 @app.route("/results")
 def results():
     """ Called when the user clicks the --> arrow on the home page."""
-    print("a5. In results() in app.py           app.route(/results)")
+    app.logger.debug("a5. In results() in app.py           app.route(/results)")
     return render_template('base.html', webnovel_title=request.args.get("title"))
     
 
@@ -211,7 +236,7 @@ def titleSearch():
     Gets the user typed query, and calls json_search to return relevant webnovels.
     Links to function filterText(id) in home.html.
     """
-    print("a6. In titleSearch() in app.py.          app.route(/titleSearch)")
+    app.logger.debug("a6. In titleSearch() in app.py.          app.route(/titleSearch)")
     text = request.args.get("inputText")
     return json_search(text)
 
@@ -221,7 +246,7 @@ def descrSearch():
     Gets the user typed query, and calls json_search to return relevant webnovels.
     Links to function filterText(id) in home.html.
     """
-    print("a6. In descrSearch() in app.py.          app.route(/descrSearch)")
+    app.logger.debug("a6. In descrSearch() in app.py.          app.route(/descrSearch)")
     text = request.args.get("inputText")
     return user_description_search(text)
 
@@ -240,7 +265,7 @@ def getNovel():
         genres: All the genres of the webnovel
     }
     """
-    print("a8. In getNovel() in app.py          app.route(/getNovel)")
+    app.logger.debug("a8. In getNovel() in app.py          app.route(/getNovel)")
 
     selectedNovel = request.args.get("title")
     index = novel_title_to_index[selectedNovel]
@@ -252,7 +277,7 @@ def getNovel():
 
 @app.route("/inforeq")
 def getExtraInfo():
-    print("a11. in getExtraInfo() in app.py().            app.route(/inforeq) ")
+    app.logger.debug("a11. in getExtraInfo() in app.py().            app.route(/inforeq) ")
     fanfic_id = int(request.args.get("fanfic_id"))
     return getExtraFanficInfo(fanfic_id)
 
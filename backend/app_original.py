@@ -20,15 +20,15 @@ with open(json_file_path, 'r') as file:
     data = json.load(file)
     episodes_df = pd.DataFrame(data['episodes'])
     reviews_df = pd.DataFrame(data['reviews'])
+    merged_df = pd.merge(episodes_df, reviews_df, left_on='id', right_on='id', how='inner')
+    titles_lower = merged_df['title'].str.lower()
 
 app = Flask(__name__)
 CORS(app)
 
 # Sample search using json with pandas
 def json_search(query):
-    matches = []
-    merged_df = pd.merge(episodes_df, reviews_df, left_on='id', right_on='id', how='inner')
-    matches = merged_df[merged_df['title'].str.lower().str.contains(query.lower())]
+    matches = merged_df[titles_lower.str.contains(query.lower())]
     matches_filtered = matches[['title', 'descr', 'imdb_rating']]
     matches_filtered_json = matches_filtered.to_json(orient='records')
     return matches_filtered_json
@@ -3,9 +3,17 @@ from collections.abc import Callable
 import numpy as np
 import math
 from collections import defaultdict, Counter
-import json
+import heapq
+from operator import itemgetter
+import orjson
+import os
+import pickle
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import re 
 from tqdm import tqdm
+from numba import njit, prange, get_num_threads
 from matplotlib import pyplot as plt
 
 from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS as stop_words, TfidfVectorizer
@@ -15,6 +23,14 @@ from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.decomposition import TruncatedSVD
 
 
+STOP_WORDS = frozenset(stop_words)
+WORD_RE = re.compile("[A-Za-z]+")
+
+FANFIC_FILES = ['fanfic_G_2019_processed-pg1.json', 'fanfic_G_2019_processed-pg2.json', 'fanfic_G_2019_processed-pg3.json']
+WEBNOVEL_FILES = ['novel_info.json']
+# bump whenever tokenization or the cached index format changes, so old caches are ignored
+INDEX_CACHE_VERSION = 1
+
 """
 fic_id_to_index: maps the fanfiction id to a zero-based index. 
   fic_id_to_index[fanfic_id] = int
@@ -54,10 +70,9 @@ def get_fanfic_data():
     """
     fanfics = []
     # files is a list of dictionaries.  List[Dict(fanfic_id, description)]
-    files = ['fanfic_G_2019_processed-pg1.json', 'fanfic_G_2019_processed-pg2.json', 'fanfic_G_2019_processed-pg3.json']
-    for file in files:
-        with open(file, 'r') as f:
-            fanfics = fanfics + json.load(f)
+    for file in FANFIC_FILES:
+        with open(file, 'rb') as f:
+            fanfics = fanfics + orjson.loads(f.read())
     return fanfics
 
 def get_webnovel_data():
@@ -78,10 +93,9 @@ def get_webnovel_data():
     """
     webnovels = []
     # files is a list of dictionaries.  List[Dict(fanfic_id, description)]
-    files = ['novel_info.json']
-    for file in files:
-        with open(file, 'r') as f:
-            webnovels = webnovels + json.load(f)
+    for file in WEBNOVEL_FILES:
+        with open(file, 'rb') as f:
+            webnovels = webnovels + orjson.loads(f.read())
     return webnovels
 
 def tokenize(text: str) -> List[str]:
@@ -100,14 +114,7 @@ def tokenize(text: str) -> List[str]:
     List[str]
         A list of strings representing the words in the text.
     """
-    tokenized_with_stop_words = re.findall("[A-Za-z]+", text.lower())
-    tokenized = []
-    for token in tokenized_with_stop_words:
-        if token in stop_words: 
-            pass
-        else:
-            tokenized.append(token)
-    return tokenized
+    return [token for token in WORD_RE.findall(text.lower()) if token not in STOP_WORDS]
 
 # files is a list of dictionaries.  List[Dict(fanfic_id, description)]
 def tokenize_fanfics(tokenize_method: Callable[[str], List[str]], 
@@ -212,29 +219,35 @@ def build_inverted_index(msgs: List[dict]) -> dict:
     [(0, 1)]
 
     """
-    iid = {}
-    for msg in range(0, len(msgs)):
-        toks = msgs[msg]['tokenized_description']
-        first_inst = {} # dictionary for each doc of first instances
-        for tok in toks:
-            #first_inst = false by default
-            # token is not in dictionary
-            if tok not in iid:
-                tup = (msg, 1)
-                iid[tok] = [(tup)]
-                first_inst[tok] = 0
-            else:       # token is in the dictionary
-                # First instance for this doc
-                if tok not in first_inst:
-                    tup = (msg, 1)
-                    iid[tok].append(tup)
-                    first_inst[tok] = len(iid[tok])-1
-                else:
-                    # increment count
-                    curr_count = (iid[tok])[first_inst[tok]][1]
-                    tup = (msg, curr_count+1)
-                    (iid[tok])[first_inst[tok]] = tup
-    return iid
+    iid = defaultdict(list)
+    # docs are visited in order, so every postings list comes out sorted by doc_index
+    for doc_id, msg in enumerate(msgs):
+        for tok, count in Counter(msg['tokenized_description']).items():
+            iid[tok].append((doc_id, count))
+    return dict(iid)
+
+def finalize_inverted_index(inv_idx: dict) -> dict:
+    """Converts the postings of an inverted index built by build_inverted_index
+    into two parallel arrays per term: np.int32 doc indexes and np.uint16 term counts
+    (a description never repeats a word 65535 times, larger counts are clipped).
+
+    Arguments
+    =========
+    inv_idx: an inverted index as above
+
+    Returns
+    =======
+
+    inverted_index: dict
+        inverted_index[term] = (doc_indexes, tfs), where doc_indexes is sorted and
+        tfs[k] is the count of the term in document doc_indexes[k]
+
+    """
+    finalized = {}
+    for term, postings in inv_idx.items():
+        postings_arr = np.array(postings, dtype=np.int32)
+        finalized[term] = (postings_arr[:, 0].copy(), np.minimum(postings_arr[:, 1], 65535).astype(np.uint16))
+    return finalized
 
 def compute_idf(inv_idx, n_docs, min_df=10, max_df_ratio=0.95):
     """Compute term IDF values from the inverted index.
@@ -242,7 +255,7 @@ def compute_idf(inv_idx, n_docs, min_df=10, max_df_ratio=0.95):
 
     Arguments
     =========
-    inv_idx: an inverted index as above
+    inv_idx: an inverted index as returned by finalize_inverted_index
 
     n_docs: int,
         The number of documents.
@@ -264,7 +277,7 @@ def compute_idf(inv_idx, n_docs, min_df=10, max_df_ratio=0.95):
     """
     idf = {}
     for term in inv_idx: 
-        term_df = len(inv_idx[term])
+        term_df = len(inv_idx[term][0])
 
         if term_df/n_docs <= max_df_ratio and term_df >= min_df:
             idf[term] = math.log2(n_docs/(1 + term_df))
@@ -282,19 +295,18 @@ def compute_doc_norms(index, idf, n_docs):
     n_docs: int,
         The total number of documents.
 
-    norms: np.array, size: n_docs
+    norms: np.array (float32), size: n_docs
         norms[i] = the norm of document i.
     """
-    norms = np.zeros((n_docs))
+    norms = np.zeros((n_docs), dtype=np.float32)
 
     for term in idf: 
-        score = idf[term]
-        term_docs = index[term]
-        for doc, tf in term_docs: 
-            norms[doc] += (tf*score)**2
-    return np.sqrt(norms)
+        score = np.float32(idf[term])
+        doc_ids, tfs = index[term]
+        np.add.at(norms, doc_ids, (tfs.astype(np.float32)*score)**2)
+    return np.sqrt(norms, out=norms)
 
-def accumulate_dot_scores(query_word_counts: dict, index: dict, idf: dict) -> dict:
+def accumulate_dot_scores(query_word_counts: dict, index: dict, idf: dict, n_docs: int) -> Tuple[np.ndarray, dict]:
     """Perform a term-at-a-time iteration to efficiently compute the numerator term of cosine similarity across multiple documents.
 
     Arguments
@@ -310,27 +322,45 @@ def accumulate_dot_scores(query_word_counts: dict, index: dict, idf: dict) -> di
     idf: dict,
         Precomputed idf values for the terms.
 
+    n_docs: int,
+        The total number of documents.
+
     Returns 
     =========
-    doc_scores: dict
-        Dictionary mapping from doc ID to the final accumulated score for that doc
+    doc_scores: np.array (float32), size: n_docs
+        doc_scores[i] = the final accumulated score for document i (0 if it shares no query words)
+
+    influential_words: dict
+        Dictionary mapping from doc ID to the (at most five) query words contributing most to its score
     """
-    doc_scores = {}
+    doc_scores = np.zeros(n_docs, dtype=np.float32)
+    query_words = list(query_word_counts)
+    word_doc_ids = []
+    word_scores = []
+    for query_word in query_words: 
+        # everything but the tf is constant across the term's postings
+        query_word_idf = idf[query_word]
+        weight = np.float32(query_word_counts[query_word]*query_word_idf*query_word_idf)
+        doc_ids, tfs = index[query_word]
+        score = tfs*weight
+        np.add.at(doc_scores, doc_ids, score)
+        word_doc_ids.append(doc_ids)
+        word_scores.append(score)
+
     influential_words = {}
-    for query_word in query_word_counts: 
-        query_word_count = query_word_counts[query_word]
-        for (doc, tf) in index[query_word]:
-            score = tf*idf[query_word]*query_word_count*idf[query_word]
-            if doc not in doc_scores: 
-                doc_scores[doc] = score
-                influential_words[doc] = [(query_word, score)]
-            else:
-                doc_scores[doc] += score
-                influential_words[doc].append((query_word, score))
-
-    for doc in influential_words: 
-        influential_words[doc] = sorted(influential_words[doc], key=lambda x: x[1], reverse=True)[:5]
-        influential_words[doc] = [t[0] for t in influential_words[doc]]
+    if query_words: 
+        docs = np.concatenate(word_doc_ids)
+        scores = np.concatenate(word_scores)
+        words = np.repeat(np.arange(len(query_words)), [len(doc_ids) for doc_ids in word_doc_ids])
+        # group by doc, highest score first, ties kept in query word order
+        order = np.lexsort((words, -scores, docs))
+        docs = docs[order]
+        words = words[order]
+        group_starts = np.flatnonzero(np.r_[True, docs[1:] != docs[:-1]])
+        rank = np.arange(len(docs)) - np.repeat(group_starts, np.diff(np.r_[group_starts, len(docs)]))
+        top = rank < 5
+        for doc, word in zip(docs[top].tolist(), words[top].tolist()):
+            influential_words.setdefault(doc, []).append(query_words[word])
 
     return doc_scores, influential_words
 
@@ -357,7 +387,8 @@ def compute_cossim_for_webnovel(
 
     score_func: function,
         A function that computes the numerator term of cosine similarity (the dot product) for all documents.
-        Takes as input a dictionary of query word counts, the inverted index, and precomputed idf values.
+        Takes as input a dictionary of query word counts, the inverted index, precomputed idf values
+        and the number of documents.
         (See accumulate_dot_scores)
 
     Returns
@@ -369,30 +400,58 @@ def compute_cossim_for_webnovel(
         with the highest score. Only the first ten. 
 
     """
-    webnovel_unique_toks = list(set(webnovel_toks))
-    webnovel_word_counts = dict(Counter(webnovel_unique_toks)) 
+    webnovel_word_counts = Counter(webnovel_toks)
 
     norm = 0
-    for term in webnovel_unique_toks: 
-        if term in fanfic_idf and term in webnovel_word_counts:
+    for term in list(webnovel_word_counts): 
+        if term in fanfic_idf:
             norm += (webnovel_word_counts[term]*fanfic_idf[term])**2
-        elif term not in fanfic_idf and term in webnovel_word_counts:
+        else:
             del webnovel_word_counts[term]
-    norms = math.sqrt(norm) * fanfic_norms
+    norm = math.sqrt(norm)
+
+    doc_scores, influence_words = score_func(webnovel_word_counts, fanfic_inv_index, fanfic_idf, len(fanfic_norms))
 
-    doc_scores, influence_words = score_func(webnovel_word_counts, fanfic_inv_index, fanfic_idf)
+    # rank in float32, the precision of the scores and norms
+    docs = np.flatnonzero(doc_scores)
+    scores = doc_scores[docs] / (np.float32(norm) * fanfic_norms[docs])
 
-    cossim = []
-    for doc in doc_scores:
-        cossim.append((doc_scores[doc]/norms[doc], doc, influence_words[doc]))
+    # partition out the top 50 and only sort those
+    k = min(50, len(docs))
+    top = docs[np.argpartition(-scores, k - 1)[:k]] if k < len(docs) else docs
 
-    result = sorted(cossim, key=lambda x: x[0], reverse=True)[:50]
+    # only the reported scores are divided out in float64
+    top_scores = doc_scores[top].astype(np.float64) / (norm * fanfic_norms[top].astype(np.float64))
+    order = np.lexsort((top, -top_scores))
+
+    result = [(top_scores[i], int(top[i]), influence_words[int(top[i])]) for i in order]
     return result
     
 
-def build_sims_cos(webnovels_tokenized, fanfic_inv_index, fanfic_idf, fanfic_norms, score_func, input_get_sims_method):
+"""
+sims_worker_state: the read-only scoring inputs of a build_sims_cos worker process, 
+  set once per worker by init_sims_worker so they are not re-sent with every webnovel.
+"""
+sims_worker_state = {}
+
+def init_sims_worker(fanfic_inv_index, fanfic_idf, fanfic_norms, score_func, input_get_sims_method):
+    sims_worker_state['fanfic_inv_index'] = fanfic_inv_index
+    sims_worker_state['fanfic_idf'] = fanfic_idf
+    sims_worker_state['fanfic_norms'] = fanfic_norms
+    sims_worker_state['score_func'] = score_func
+    sims_worker_state['input_get_sims_method'] = input_get_sims_method
+
+def score_webnovel(webnovel):
+    """Ranks the fanfics for a single tokenized webnovel inside a build_sims_cos worker."""
+    results = sims_worker_state['input_get_sims_method'](webnovel['tokenized_description'], sims_worker_state['fanfic_inv_index'], 
+                                                         sims_worker_state['fanfic_idf'], sims_worker_state['fanfic_norms'], 
+                                                         sims_worker_state['score_func'])
+    return webnovel['index'], results
+
+def build_sims_cos(webnovels_tokenized, fanfic_inv_index, fanfic_idf, fanfic_norms, score_func, input_get_sims_method, max_workers=None):
     """Returns a cosine similarity dictionary with len(webnovels_tokenized) keys:
         [webnovel_index] should be the ranked list of cosine similarity between the webnovel and all fanfics 
+    The webnovels are scored independently, so they are spread over a pool of worker processes.
     
     Arguments
     =========
@@ -401,19 +460,22 @@ def build_sims_cos(webnovels_tokenized, fanfic_inv_index, fanfic_idf, fanfic_nor
         a function to compute a ranked cosine similarity list between a singular webnovel and all relevant fanfics
         (look at compute_cossim_for_webnovel)
 
+    max_workers: int,
+        Number of worker processes, defaults to the number of CPUs.
+
     Returns
     =========
     webnovel_sims: dict
         The key is a webnovel_index and the value is a ranked list of cosine similarity (cos sim score, fanfic_index)
     """
     webnovel_sims_and_influential_words = {} # key - webnovel id, value = list of sorted fanfics by similarity (cos sim score, fanfic index)
-    webnovel_influential_words = {}
-    n_webnovels = len(webnovels_tokenized)
 
-    for i in tqdm(range(n_webnovels)):
-        webnovel = webnovels_tokenized[i]
-        results = input_get_sims_method(webnovel['tokenized_description'], fanfic_inv_index, fanfic_idf, fanfic_norms, score_func)
-        webnovel_sims_and_influential_words[webnovel['index']] = results
+    # fork lets the workers inherit the (large) index instead of unpickling a copy each
+    mp_context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context, initializer=init_sims_worker, 
+                             initargs=(fanfic_inv_index, fanfic_idf, fanfic_norms, score_func, input_get_sims_method)) as executor:
+        for index, results in tqdm(executor.map(score_webnovel, webnovels_tokenized, chunksize=64), total=len(webnovels_tokenized)):
+            webnovel_sims_and_influential_words[index] = results
 
     return webnovel_sims_and_influential_words
 
@@ -512,6 +574,60 @@ def filter_fanfics(fanfics, tags_list):
     return filtered_fanfics
 
 
+def load_or_build_fanfic_index(fanfics, webnovels):
+    """ Tokenizes the fanfics and webnovels and builds the fanfic inverted index, idf and norms.
+    The results (and the id mappings filled in by tokenize_fanfics/tokenize_webnovels) are 
+    cached to cache_<signature>.pkl/.npz, where the signature is taken from INDEX_CACHE_VERSION, 
+    the modification times of the source data files and the ids of the (filtered) fanfics, 
+    so reruns on unchanged data skip straight to ranking.
+
+    Arguments
+    =========
+    fanfics: the (filtered) fanfics from get_fanfic_data()
+    webnovels: the webnovels from get_webnovel_data()
+
+    Returns
+    =========
+    (webnovels_tokenized, fanfic_inverted_index, fanfic_idf, fanfic_norms)
+    """
+    mtimes = [os.path.getmtime(file) for file in FANFIC_FILES + WEBNOVEL_FILES]
+    fanfic_ids = [fanfic['id'] for fanfic in fanfics]
+    signature = hashlib.md5(repr((INDEX_CACHE_VERSION, mtimes, len(fanfic_ids), fanfic_ids)).encode()).hexdigest()[:12]
+    pickle_file = f'cache_{signature}.pkl'
+    arrays_file = f'cache_{signature}.npz'
+
+    if os.path.exists(pickle_file) and os.path.exists(arrays_file):
+        with open(pickle_file, 'rb') as f:
+            cached = pickle.load(f)
+        with np.load(arrays_file) as arrays:
+            fanfic_idf = dict(zip(arrays['idf_terms'].tolist(), arrays['idf_values'].tolist()))
+            fanfic_norms = arrays['fanfic_norms']
+        fic_id_to_index.update(cached['fic_id_to_index'])
+        index_to_fic_id.update(cached['index_to_fic_id'])
+        fanfic_id_to_popularity.update(cached['fanfic_id_to_popularity'])
+        webnovel_title_to_index.update(cached['webnovel_title_to_index'])
+        index_to_webnovel_title.update(cached['index_to_webnovel_title'])
+        return cached['webnovels_tokenized'], cached['fanfic_inverted_index'], fanfic_idf, fanfic_norms
+
+    n_fanfics = len(fanfics)
+
+    fanfics_tokenized = tokenize_fanfics(tokenize, fanfics)
+    webnovels_tokenized = tokenize_webnovels(tokenize, webnovels)
+
+    fanfic_inverted_index = finalize_inverted_index(build_inverted_index(fanfics_tokenized))
+    fanfic_idf = compute_idf(fanfic_inverted_index, n_fanfics)
+    fanfic_norms = compute_doc_norms(fanfic_inverted_index, fanfic_idf, n_fanfics)
+
+    with open(pickle_file, 'wb') as f:
+        pickle.dump({'webnovels_tokenized': webnovels_tokenized, 'fanfic_inverted_index': fanfic_inverted_index, 
+                     'fic_id_to_index': fic_id_to_index, 'index_to_fic_id': index_to_fic_id, 
+                     'fanfic_id_to_popularity': fanfic_id_to_popularity, 'webnovel_title_to_index': webnovel_title_to_index, 
+                     'index_to_webnovel_title': index_to_webnovel_title}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    np.savez_compressed(arrays_file, fanfic_norms=fanfic_norms, 
+                        idf_terms=np.array(list(fanfic_idf.keys())), idf_values=np.array(list(fanfic_idf.values())))
+
+    return webnovels_tokenized, fanfic_inverted_index, fanfic_idf, fanfic_norms
+
 def main():
     fanfics = get_fanfic_data()
     webnovels = get_webnovel_data()
@@ -528,14 +644,7 @@ def main():
     # plt.savefig("kplot.png")
     # svd stuff end
 
-    n_fanfics = len(fanfics)
-
-    fanfics_tokenized = tokenize_fanfics(tokenize, fanfics)
-    webnovels_tokenized = tokenize_webnovels(tokenize, webnovels)
-
-    fanfic_inverted_index = build_inverted_index(fanfics_tokenized)
-    fanfic_idf = compute_idf(fanfic_inverted_index, n_fanfics)
-    fanfic_norms = compute_doc_norms(fanfic_inverted_index, fanfic_idf, n_fanfics)
+    webnovels_tokenized, fanfic_inverted_index, fanfic_idf, fanfic_norms = load_or_build_fanfic_index(fanfics, webnovels)
 
     # # Comment this when actually running
     # cossims_and_influential_words = build_sims_cos(webnovels_tokenized[:5], fanfic_inverted_index, fanfic_idf, fanfic_norms, accumulate_dot_scores, compute_cossim_for_webnovel)
@@ -545,8 +654,10 @@ def main():
     cossims_and_influential_words = build_sims_cos(webnovels_tokenized, fanfic_inverted_index, fanfic_idf, fanfic_norms, accumulate_dot_scores, compute_cossim_for_webnovel)
     file = 'webnovel_to_fanfic_cossim.json'
 
-    with open(file, 'w', encoding='utf-8') as f:
-        json.dump({'cossims_and_influential_words':cossims_and_influential_words, 'fic_id_to_index': fic_id_to_index, 'index_to_fanfic_id':index_to_fic_id, 'webnovel_title_to_index':webnovel_title_to_index, 'fanfic_id_to_popularity':fanfic_id_to_popularity, 'tags_list':tags_list}, f)
+    # the id mappings have int keys and the scores are numpy floats, which orjson only serializes with these options
+    with open(file, 'wb') as f:
+        f.write(orjson.dumps({'cossims_and_influential_words':cossims_and_influential_words, 'fic_id_to_index': fic_id_to_index, 'index_to_fanfic_id':index_to_fic_id, 'webnovel_title_to_index':webnovel_title_to_index, 'fanfic_id_to_popularity':fanfic_id_to_popularity, 'tags_list':tags_list}, 
+                             option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY))
 
 
 if __name__ == "__main__":
@@ -610,6 +721,160 @@ def edit_matrix(query, message, ins_cost_func, del_cost_func, sub_cost_func):
     return chart
 
 
+def encode_text(text):
+    """Encodes a string as an array of unicode code points so it can be passed to the jitted kernels."""
+    return np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+
+
+@njit(cache=True)
+def _edit_njit(query, message):
+    """Unit cost edit distance between two encoded strings (see encode_text).
+    Only the previous row of the edit matrix is kept, so memory is O(min(m, n)).
+    """
+    # unit costs are symmetric, so let the shorter string index the columns
+    if len(message) > len(query):
+        query, message = message, query
+    m = len(query)
+    n = len(message)
+
+    prev = np.arange(n + 1).astype(np.int32)
+    curr = np.empty_like(prev)
+    for i in range(1, m + 1):
+        curr[0] = i
+        for j in range(1, n + 1):
+            sub = prev[j - 1]
+            if query[i - 1] != message[j - 1]:
+                sub += 1
+            curr[j] = min(prev[j] + 1, curr[j - 1] + 1, sub)
+        prev, curr = curr, prev
+    return prev[n]
+
+
+@njit(cache=True)
+def _edit_banded_njit(query, message, cutoff):
+    """Unit cost edit distance (Ukkonen's cutoff variant) between two encoded strings.
+    Only the diagonal band of width 2*cutoff+1 is filled, and cutoff + 1 is returned as 
+    soon as the distance is known to exceed cutoff.
+    """
+    m = len(query)
+    n = len(message)
+    over = cutoff + 1
+    if abs(m - n) > cutoff:
+        return over
+
+    prev = np.full(n + 2, over, dtype=np.int64)
+    curr = np.full(n + 2, over, dtype=np.int64)
+    for j in range(min(n, cutoff) + 1):
+        prev[j] = j
+    for i in range(1, m + 1):
+        lo = max(1, i - cutoff)
+        hi = min(n, i + cutoff)
+        curr[lo - 1] = i if lo == 1 and i <= cutoff else over
+        row_min = curr[lo - 1]
+        for j in range(lo, hi + 1):
+            sub = prev[j - 1]
+            if query[i - 1] != message[j - 1]:
+                sub += 1
+            curr[j] = min(prev[j] + 1, curr[j - 1] + 1, sub, over)
+            row_min = min(row_min, curr[j])
+        # the next row reads one cell past this row's band
+        curr[hi + 1] = over
+        if row_min > cutoff:
+            return over
+        prev, curr = curr, prev
+    return prev[n]
+
+
+@njit(parallel=True, cache=True)
+def _batch_topk_edit_njit(query, texts, lens, k, n_chunks, out):
+    """Unit cost edit distance between an encoded query and every row of a non-empty packed
+    text matrix (see pack_texts), where only the k closest texts get exact distances.
+    The texts are split into n_chunks interleaved chunks; each keeps its own k best distances 
+    and passes the worst of them as the cutoff to _edit_banded_njit, so hopeless texts are 
+    abandoned early; their out entry is only a lower bound that already ranks them below 
+    k other texts.
+    """
+    n_texts = texts.shape[0]
+    # no distance can exceed the longer of the two strings
+    worst = len(query) + lens.max()
+    chunk_best = np.full((n_chunks, k), worst, dtype=np.int64)
+    for c in prange(n_chunks):
+        best = chunk_best[c]
+        for t in range(c, n_texts, n_chunks):
+            cutoff = best.max()
+            dist = _edit_banded_njit(query, texts[t, :lens[t]], cutoff)
+            out[t] = dist
+            if dist < cutoff:
+                best[np.argmax(best)] = dist
+
+
+def myers_peq(query):
+    """Builds the Myers pattern bitmasks: peq[c] has bit i set iff query[i] == c."""
+    peq = {}
+    for i, c in enumerate(query):
+        peq[c] = peq.get(c, 0) | (1 << i)
+    return peq
+
+
+@njit(cache=True)
+def _myers_njit(peq_chars, peq_masks, m, text):
+    """Unit cost edit distance using Myers' bit-parallel algorithm (global distance variant).
+    Each column of the edit matrix is held as bit vectors of vertical +1/-1 deltas, so a
+    whole column is computed with a handful of integer operations per text character.
+    The query (1 to 64 characters, so a column fits in a machine word) is given as its sorted
+    distinct code points and their myers_peq bitmasks (see edit_distance_search).
+    """
+    one = np.uint64(1)
+    mask = np.uint64(0xFFFFFFFFFFFFFFFF) >> np.uint64(64 - m)
+    high_bit = one << np.uint64(m - 1)
+
+    pv = mask
+    mv = np.uint64(0)
+    score = m
+    for k in range(len(text)):
+        pos = np.searchsorted(peq_chars, text[k])
+        eq = np.uint64(0)
+        if pos < len(peq_chars) and peq_chars[pos] == text[k]:
+            eq = peq_masks[pos]
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        if ph & high_bit:
+            score += 1
+        elif mh & high_bit:
+            score -= 1
+        # the first row grows by one per column, so shift a +1 delta in
+        ph = ((ph << one) | one) & mask
+        mh = (mh << one) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+    return score
+
+
+@njit(parallel=True, cache=True)
+def _batch_myers_njit(peq_chars, peq_masks, m, texts, lens, out):
+    """_myers_njit against every row of a packed text matrix (see pack_texts)."""
+    for k in prange(texts.shape[0]):
+        out[k] = _myers_njit(peq_chars, peq_masks, m, texts[k, :lens[k]])
+
+
+def pack_texts(texts):
+    """Lowercases and packs a list of strings into a zero padded code point matrix
+    for _batch_myers_njit and _batch_topk_edit_njit.
+
+    Returns:
+        (texts_arr np.array size: (len(texts), max_len), lens np.array size: len(texts))
+    """
+    # lowercasing can change the length (e.g. 'İ' -> 'i̇'), so measure after it
+    lowered = [text.lower() for text in texts]
+    lens = np.array([len(text) for text in lowered], dtype=np.int32)
+    texts_arr = np.zeros((len(texts), lens.max(initial=0)), dtype=np.uint32)
+    for k, text in enumerate(lowered):
+        texts_arr[k, :lens[k]] = encode_text(text)
+    return texts_arr, lens
+
+
 def edit_distance(
     query: str, message: str, ins_cost_func: int, del_cost_func: int, sub_cost_func: int
 ) -> int:
@@ -634,7 +899,10 @@ def edit_distance(
     query = query.lower()     # rows
     message = message.lower() # cols
 
-    # TODO-1.1
+    # The unit costs are inlined in the jitted kernel
+    if ins_cost_func is insertion_cost and del_cost_func is deletion_cost and sub_cost_func is substitution_cost:
+        return int(_edit_njit(encode_text(query), encode_text(message)))
+
     edit_d_matrix = edit_matrix(query, message, ins_cost_func, del_cost_func, sub_cost_func)
     return edit_d_matrix[(len(query), len(message))]
 
@@ -645,6 +913,7 @@ def edit_distance_search(
     ins_cost_func: int,
     del_cost_func: int,
     sub_cost_func: int,
+    packed_msgs=None,
 ) -> List[Tuple[int, str]]:
     """Edit distance search
 
@@ -663,21 +932,54 @@ def edit_distance_search(
 
     sub_cost_func: function that returns the cost of substituting a letter,
 
+    packed_msgs: optional pack_texts() result for the msgs' texts,
+        pack once and pass it in to avoid repacking a static corpus on every query.
+
     Returns
     =======
     result: list of (score, message) tuples.
-        The result list is sorted by score such that the closest match
+        The ten closest messages, sorted by score such that the closest match
         is the top result in the list.
 
     """
+    texts = [msg['text'] for msg in msgs]
+    if not texts:
+        return []
+    if ins_cost_func is insertion_cost and del_cost_func is deletion_cost and sub_cost_func is substitution_cost:
+        if packed_msgs is None:
+            packed_msgs = pack_texts(texts)
+        texts_arr, lens = packed_msgs
+        dists = np.empty(len(texts), dtype=np.int32)
+        query = query.lower()
+        if len(query) == 0:
+            dists[:] = lens
+        elif len(query) <= 64:
+            # short (autocomplete) queries fit in one machine word: use the bit-parallel kernel
+            peq = myers_peq(encode_text(query).tolist())
+            peq_chars = np.array(sorted(peq), dtype=np.uint32)
+            peq_masks = np.array([peq[c] for c in sorted(peq)], dtype=np.uint64)
+            _batch_myers_njit(peq_chars, peq_masks, len(query), texts_arr, lens, dists)
+        else:
+            n_chunks = min(get_num_threads(), len(texts))
+            _batch_topk_edit_njit(encode_text(query), texts_arr, lens, 10, n_chunks, dists)
+
+        k = min(10, len(texts))
+        if k < len(texts):
+            # break ties at the k-th distance by message order, like a stable sort would
+            kth = np.partition(dists, k - 1)[k - 1]
+            top = np.flatnonzero(dists < kth)
+            top = np.concatenate((top, np.flatnonzero(dists == kth)[:k - len(top)]))
+        else:
+            top = np.arange(len(texts))
+        top = top[np.lexsort((top, dists[top]))]
+        return [(int(dists[i]), texts[i]) for i in top]
+
     result = []
-    for msg in msgs:
+    for text in texts:
       
-      dist = edit_distance(query,msg['text'],ins_cost_func,del_cost_func,sub_cost_func)
-      result.append((dist,msg['text']))
-    result.sort(key=lambda tup: tup[0])
-    print(result[:10])
-    return result
+      dist = edit_distance(query,text,ins_cost_func,del_cost_func,sub_cost_func)
+      result.append((dist,text))
+    return heapq.nsmallest(10, result, key=itemgetter(0))
     # TODO-1.2
     lst_of_tups = []
     